@@ -1,26 +1,25 @@
 """Cleanup script to remove smoke-test data created by `smoke_test.py`.
-Removes the user with reg_number 'SMOKE_RN_001' and their fitness items.
+Removes the users with reg_number 'SMOKE_RN_001' and 'SMOKE_RN_LEGACY' and their fitness items.
 Run with: python clean_smoke_data.py
 """
 from app import app, db, User, FitnessItem
 
-TEST_REG = 'SMOKE_RN_001'
+TEST_REGS = ('SMOKE_RN_001', 'SMOKE_RN_LEGACY')
 
 
 def run():
     with app.app_context():
-        user = User.query.filter_by(reg_number=TEST_REG).first()
-        if not user:
+        users = User.query.filter(User.reg_number.in_(TEST_REGS)).all()
+        if not users:
             print('No smoke-test user found.')
             return 0
 
-        # Delete fitness items explicitly (relationship cascade also covers this)
-        items = FitnessItem.query.filter_by(user_id=user.id).all()
-        for it in items:
-            db.session.delete(it)
-        db.session.delete(user)
+        for user in users:
+            # Single bulk DELETE instead of loading and deleting items one by one
+            deleted = FitnessItem.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+            db.session.delete(user)
+            print(f'Removed user {user.reg_number} and {deleted} fitness items.')
         db.session.commit()
-        print(f'Removed user {TEST_REG} and {len(items)} fitness items.')
         return 0
 
 
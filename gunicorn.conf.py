@@ -0,0 +1,21 @@
+"""Gunicorn settings for production. Picked up automatically by `gunicorn app:app`.
+Password hashing is CPU-bound, so run one worker per core to keep a slow
+/register or /login from blocking other requests.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.getenv('GUNICORN_THREADS', 2))
+
+
+def post_fork(server, worker):
+    """Warm the DB pool, bcrypt and JWT code paths before the worker takes traffic."""
+    from app import app, db, bcrypt
+    from flask_jwt_extended import create_access_token, decode_token
+
+    with app.app_context():
+        db.engine.connect().close()
+        decode_token(create_access_token(identity=0))
+    bcrypt.check_password_hash(bcrypt.generate_password_hash('warmup', rounds=4), 'warmup')
@@ -1,12 +1,30 @@
 """Simple smoke test for the Fitness_App Flask API.
-This script uses Flask's test client to exercise register -> login -> create -> list flows.
+This script uses Flask's test client to exercise register -> login -> create -> list -> update -> delete flows,
+plus the bcrypt upgrade of a legacy werkzeug password hash on login.
 Run with: python smoke_test.py
 """
 import sys
-from app import app, db
+import orjson
+from werkzeug.security import generate_password_hash
+from app import app, db, User
 
 TEST_REG = "SMOKE_RN_001"
 TEST_PASSWORD = "smokepass"
+LEGACY_REG = "SMOKE_RN_LEGACY"
+
+# Request bodies are encoded once up front instead of on every client call
+JSON = 'application/json'
+REGISTER_BODY = orjson.dumps({
+    'name': 'SmokeTester',
+    'reg_number': TEST_REG,
+    'password': TEST_PASSWORD,
+})
+LOGIN_BODY = orjson.dumps({'reg_number': TEST_REG, 'password': TEST_PASSWORD})
+CREATE_BODY = orjson.dumps({'title': 'Test Run', 'description': '3km'})
+UPDATE_BODY = orjson.dumps({'title': 'Test Run (edited)', 'description': '5km'})
+NO_CHANGE_BODY = orjson.dumps({'description': None})
+MISSING_ITEM_ID = 0
+LEGACY_LOGIN_BODY = orjson.dumps({'reg_number': LEGACY_REG, 'password': TEST_PASSWORD})
 
 
 def run():
@@ -17,18 +35,14 @@ def run():
     client = app.test_client()
 
     # 1) Register (ignore 409 if it already exists)
-    resp = client.post('/register', json={
-        'name': 'SmokeTester',
-        'reg_number': TEST_REG,
-        'password': TEST_PASSWORD,
-    })
+    resp = client.post('/register', data=REGISTER_BODY, content_type=JSON)
     print('register:', resp.status_code, resp.get_json())
     if resp.status_code not in (201, 409):
         print('Register failed unexpectedly')
         return 2
 
     # 2) Login
-    resp = client.post('/login', json={'reg_number': TEST_REG, 'password': TEST_PASSWORD})
+    resp = client.post('/login', data=LOGIN_BODY, content_type=JSON)
     print('login:', resp.status_code, resp.get_json())
     if resp.status_code != 200:
         print('Login failed')
@@ -42,12 +56,14 @@ def run():
     headers = {'Authorization': f'Bearer {token}'}
 
     # 3) Create fitness item
-    resp = client.post('/fitness', json={'title': 'Test Run', 'description': '3km'}, headers=headers)
+    resp = client.post('/fitness', data=CREATE_BODY, content_type=JSON, headers=headers)
     print('create fitness:', resp.status_code, resp.get_json())
     if resp.status_code != 201:
         print('Create fitness failed')
         return 5
 
+    item_id = resp.get_json()['item']['id']
+
     # 4) List fitness items
     resp = client.get('/fitness', headers=headers)
     print('list fitness:', resp.status_code, resp.get_json())
@@ -60,6 +76,64 @@ def run():
         print('Unexpected items list')
         return 7
 
+    # 5) Update fitness item
+    resp = client.put(f'/fitness/{item_id}', data=UPDATE_BODY, content_type=JSON, headers=headers)
+    print('update fitness:', resp.status_code, resp.get_json())
+    if resp.status_code != 200 or resp.get_json()['item'] != {
+        'id': item_id, 'title': 'Test Run (edited)', 'description': '5km', 'user_id': items[0]['user_id'],
+    }:
+        print('Update fitness failed')
+        return 8
+
+    # 6) Update with nothing to change (null description is ignored) returns the item as-is
+    resp = client.put(f'/fitness/{item_id}', data=NO_CHANGE_BODY, content_type=JSON, headers=headers)
+    print('update fitness (no change):', resp.status_code, resp.get_json())
+    if resp.status_code != 200 or resp.get_json()['item']['description'] != '5km':
+        print('No-op update failed')
+        return 9
+
+    # 7) Update a missing item
+    resp = client.put(f'/fitness/{MISSING_ITEM_ID}', data=UPDATE_BODY, content_type=JSON, headers=headers)
+    print('update missing fitness:', resp.status_code, resp.get_json())
+    if resp.status_code != 404:
+        print('Update of missing item did not return 404')
+        return 10
+
+    # 8) Delete fitness item, then again to check it is gone
+    resp = client.delete(f'/fitness/{item_id}', headers=headers)
+    print('delete fitness:', resp.status_code, resp.get_json())
+    if resp.status_code != 200:
+        print('Delete fitness failed')
+        return 11
+
+    resp = client.delete(f'/fitness/{item_id}', headers=headers)
+    print('delete fitness again:', resp.status_code, resp.get_json())
+    if resp.status_code != 404:
+        print('Repeat delete did not return 404')
+        return 12
+
+    # 9) A user with a pre-bcrypt werkzeug hash can log in and is upgraded to bcrypt
+    with app.app_context():
+        user = User.query.filter_by(reg_number=LEGACY_REG).first()
+        if user is None:
+            user = User(name='SmokeLegacy', reg_number=LEGACY_REG)
+            db.session.add(user)
+        user.password_hash = generate_password_hash(TEST_PASSWORD)
+        db.session.commit()
+
+    resp = client.post('/login', data=LEGACY_LOGIN_BODY, content_type=JSON)
+    print('legacy login:', resp.status_code, resp.get_json())
+    if resp.status_code != 200:
+        print('Legacy-hash login failed')
+        return 13
+
+    with app.app_context():
+        stored = User.query.filter_by(reg_number=LEGACY_REG).first().password_hash
+    print('legacy hash upgraded:', stored[:7])
+    if not stored.startswith('$2'):
+        print('Legacy hash was not upgraded to bcrypt')
+        return 14
+
     print('SMOKE TEST PASSED')
     return 0
 